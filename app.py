@@ -5,8 +5,14 @@ This module contains a Flask application for medical disease prediction
 using machine learning models.
 """
 
+import click
 from flask import Flask, render_template, request, redirect, url_for, session, jsonify
+from flask.json.provider import DefaultJSONProvider, JSONProvider
 from flask_sqlalchemy import SQLAlchemy
+import orjson
+from sqlalchemy import event
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
 import pickle
 import os
 from dotenv import load_dotenv
@@ -16,20 +22,65 @@ from uuid import uuid4
 import google.generativeai as genai
 import requests
 import re
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.naive_bayes import GaussianNB
+from sklearn.preprocessing import MinMaxScaler, StandardScaler
+from sklearn.svm import SVC
+import queue
+import threading
+from concurrent.futures import Future
 from werkzeug.security import generate_password_hash, check_password_hash
 
+try:
+    import tensorflow as tf
+except ImportError:  # DL models then fall back to Keras predict()
+    tf = None
+
+try:
+    import treelite
+    import tl2cgen
+except ImportError:  # Random forests then fall back to sklearn predict()
+    treelite = tl2cgen = None
+
+try:
+    from numba import njit
+except ImportError:  # Linear/NB models then fall back to sklearn predict()
+    njit = None
+
 # Load environment variables
 load_dotenv()
 
+
+class ORJSONProvider(JSONProvider):
+    """JSON provider that serializes responses with orjson."""
+
+    def dumps(self, obj, **kwargs):
+        """Serialize obj to a JSON string, handling NumPy values natively."""
+        return orjson.dumps(
+            obj, default=DefaultJSONProvider.default, option=orjson.OPT_SERIALIZE_NUMPY
+        ).decode()
+
+    def loads(self, s, **kwargs):
+        """Deserialize a JSON string or bytes."""
+        return orjson.loads(s)
+
+
 # Initialize Flask app
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 app.config['SECRET_KEY'] = str(uuid4())  # Use a random UUID for security
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///medical.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///medical.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    'pool_pre_ping': False,  # Local SQLite connections don't drop
+    'connect_args': {'check_same_thread': False}
+}
+app.config['PASSWORD_HASH_METHOD'] = 'scrypt'  # Werkzeug's default KDF
 db = SQLAlchemy(app)
 
 # Configure logging
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING").upper())
 logger = logging.getLogger(__name__)
 
 # Configure Gemini API
@@ -41,63 +92,376 @@ else:
     logger.info("Gemini API configured successfully")
 
 
+# Pickled model and scaler files for each disease
+MODEL_FILES = {
+    'heart-attack': {
+        'scaler': 'heart_attack/heart_scaler',
+        'KNN': 'heart_attack/KNN_model',
+        'DT': 'heart_attack/DT_model',
+        'RF': 'heart_attack/RF_model',
+        'LR': 'heart_attack/LR_model',
+        'SVM': 'heart_attack/SVM_model',
+        'NB': 'heart_attack/NB_model',
+        'DL': 'heart_attack/DL_model',
+        'QNN': 'heart_attack/qnn_model.pkl'
+    },
+    'breast-cancer': {
+        'scaler': 'breast_cancer/breast_scaler',
+        'KNN': 'breast_cancer/KNN_model',
+        'DT': 'breast_cancer/DT_model',
+        'RF': 'breast_cancer/RF_model',
+        'LR': 'breast_cancer/LR_model',
+        'SVM': 'breast_cancer/SVM_model',
+        'NB': 'breast_cancer/NB_model',
+        'DL': 'breast_cancer/DL_model'
+    },
+    'diabetes': {
+        'scaler': 'diabetes/diabetes_scaler',
+        'KNN': 'diabetes/KNN_model',
+        'DT': 'diabetes/DT_model',
+        'RF': 'diabetes/RF_model',
+        'LR': 'diabetes/LR_model',
+        'SVM': 'diabetes/SVM_model',
+        'NB': 'diabetes/NB_model',
+        'DL': 'diabetes/DL_model',
+        'QNN': 'diabetes/qnn_model.pkl'
+    },
+    'lung-cancer': {
+        'scaler': 'lung_cancer/lung_scaler',
+        'KNN': 'lung_cancer/KNN_model',
+        'DT': 'lung_cancer/DT_model',
+        'RF': 'lung_cancer/RF_model',
+        'LR': 'lung_cancer/LR_model',
+        'SVM': 'lung_cancer/SVM_model',
+        'NB': 'lung_cancer/NB_model',
+        'DL': 'lung_cancer/DL_model',
+        'QNN': 'lung_cancer/qnn_model.pkl'
+    }
+}
+
+
+def _pload(path):
+    """Unpickle a model file through a large read buffer and close it afterwards."""
+    with open(path, 'rb', buffering=1 << 20) as f:
+        return pickle.load(f)
+
+
+def _load_model(disease, kind):
+    """Unpickle one model or scaler, plus any entries derived from it."""
+    path = MODEL_FILES[disease][kind]
+    model = _pload(path)
+    entries = {kind: model}
+    if kind == 'scaler':
+        entries['scaler_affine'] = _scaler_affine(model)
+    elif kind == 'DL':
+        entries['DL_fn'] = _compile_dl(model)
+    elif kind == 'RF':
+        entries['RF_fn'] = _load_trees(model, path)
+    elif kind in ('LR', 'SVM', 'NB'):
+        entries[f'{kind}_fn'] = _compile_sklearn(model)
+    return entries
+
+
 def load_model_files():
     """Load all machine learning models and scalers from files."""
-    models_dict = {
-        'heart-attack': {
-            'scaler': pickle.load(open('heart_attack/heart_scaler', 'rb')),
-            'KNN': pickle.load(open('heart_attack/KNN_model', 'rb')),
-            'DT': pickle.load(open('heart_attack/DT_model', 'rb')),
-            'RF': pickle.load(open('heart_attack/RF_model', 'rb')),
-            'LR': pickle.load(open('heart_attack/LR_model', 'rb')),
-            'SVM': pickle.load(open('heart_attack/SVM_model', 'rb')),
-            'NB': pickle.load(open('heart_attack/NB_model', 'rb')),
-            'DL': pickle.load(open('heart_attack/DL_model', 'rb')),
-            'QNN' : pickle.load(open('heart_attack/qnn_model.pkl', 'rb'))
-        },
-        'breast-cancer': {
-            'scaler': pickle.load(open('breast_cancer/breast_scaler', 'rb')),
-            'KNN': pickle.load(open('breast_cancer/KNN_model', 'rb')),
-            'DT': pickle.load(open('breast_cancer/DT_model', 'rb')),
-            'RF': pickle.load(open('breast_cancer/RF_model', 'rb')),
-            'LR': pickle.load(open('breast_cancer/LR_model', 'rb')),
-            'SVM': pickle.load(open('breast_cancer/SVM_model', 'rb')),
-            'NB': pickle.load(open('breast_cancer/NB_model', 'rb')),
-            'DL': pickle.load(open('breast_cancer/DL_model', 'rb'))
-        },
-        'diabetes': {
-            'scaler': pickle.load(open('diabetes/diabetes_scaler', 'rb')),
-            'KNN': pickle.load(open('diabetes/KNN_model', 'rb')),
-            'DT': pickle.load(open('diabetes/DT_model', 'rb')),
-            'RF': pickle.load(open('diabetes/RF_model', 'rb')),
-            'LR': pickle.load(open('diabetes/LR_model', 'rb')),
-            'SVM': pickle.load(open('diabetes/SVM_model', 'rb')),
-            'NB': pickle.load(open('diabetes/NB_model', 'rb')),
-            'DL': pickle.load(open('diabetes/DL_model', 'rb')),
-            'QNN' : pickle.load(open('diabetes/qnn_model.pkl', 'rb'))
-        },
-        'lung-cancer': {
-            'scaler': pickle.load(open('lung_cancer/lung_scaler', 'rb')),
-            'KNN': pickle.load(open('lung_cancer/KNN_model', 'rb')),
-            'DT': pickle.load(open('lung_cancer/DT_model', 'rb')),
-            'RF': pickle.load(open('lung_cancer/RF_model', 'rb')),
-            'LR': pickle.load(open('lung_cancer/LR_model', 'rb')),
-            'SVM': pickle.load(open('lung_cancer/SVM_model', 'rb')),
-            'NB': pickle.load(open('lung_cancer/NB_model', 'rb')),
-            'DL': pickle.load(open('lung_cancer/DL_model', 'rb')),
-            'QNN' : pickle.load(open('lung_cancer/qnn_model.pkl', 'rb'))
-        }
-    }
+    models_dict = {}
+    for disease, files in MODEL_FILES.items():
+        models_dict[disease] = {}
+        for kind in files:
+            models_dict[disease].update(_load_model(disease, kind))
     logger.info("Models and scalers loaded successfully")
     return models_dict
 
 
-# Load the models at application startup
-try:
-    models = load_model_files()
-except Exception as e:
-    logger.error(f"Error loading models: {str(e)}")
-    models = {}
+def _scaler_affine(scaler):
+    """Reduce a fitted scaler to a (scale, offset, clip) affine, or None if unsupported."""
+    if isinstance(scaler, MinMaxScaler):
+        clip = scaler.feature_range if scaler.clip else None
+        return np.asarray(scaler.scale_, dtype=np.float64), np.asarray(scaler.min_, dtype=np.float64), clip
+    if isinstance(scaler, StandardScaler):
+        # fit() still sets mean_ when with_mean=False, but transform() ignores it
+        n_features = scaler.n_features_in_
+        scale = 1.0 / scaler.scale_ if scaler.with_std and scaler.scale_ is not None else np.ones(n_features)
+        mean = scaler.mean_ if scaler.with_mean and scaler.mean_ is not None else np.zeros(n_features)
+        return np.asarray(scale, dtype=np.float64), np.asarray(-mean * scale, dtype=np.float64), None
+    return None
+
+
+def _scale_features(disease_models, features, out=None):
+    """Scale one feature row, skipping sklearn's transform() when an affine is cached.
+
+    If ``out`` is given, the affine result is written into it in place.
+    """
+    affine = disease_models.get('scaler_affine')
+    if affine is None:
+        return disease_models['scaler'].transform([features])[0]
+    scale, offset, clip = affine
+    scaled = np.multiply(features, scale, out=out)
+    scaled += offset
+    if clip is not None:
+        np.clip(scaled, clip[0], clip[1], out=scaled)
+    return scaled
+
+
+# Models are loaded lazily, per disease and model type, on first use
+models = {}
+_models_lock = threading.Lock()
+
+
+def get_model(disease, kind):
+    """Get a disease's model or scaler, unpickling it on first use."""
+    disease_models = models.get(disease)
+    if disease_models is None or kind not in disease_models:
+        with _models_lock:
+            disease_models = models.setdefault(disease, {})
+            if kind not in disease_models:
+                disease_models.update(_load_model(disease, kind))
+                logger.info("Loaded %s for %s", kind, disease)
+    return disease_models[kind]
+
+
+def _linear_kernel(X, coef, intercept, out):
+    """Write 1 to out[i] where row i's linear decision value is positive, else 0."""
+    for i in range(X.shape[0]):
+        s = intercept
+        for j in range(X.shape[1]):
+            s += X[i, j] * coef[j]
+        out[i] = 1 if s > 0 else 0
+
+
+def _gaussian_nb_kernel(X, theta, inv_var, const, out):
+    """Write the index of the class with the highest Gaussian joint log-likelihood."""
+    for i in range(X.shape[0]):
+        best = 0
+        best_jll = -np.inf
+        for c in range(theta.shape[0]):
+            jll = const[c]
+            for j in range(X.shape[1]):
+                d = X[i, j] - theta[c, j]
+                jll -= 0.5 * d * d * inv_var[c, j]
+            if jll > best_jll:
+                best_jll = jll
+                best = c
+        out[i] = best
+
+
+if njit is not None:
+    _linear_kernel = njit(cache=True)(_linear_kernel)
+    _gaussian_nb_kernel = njit(cache=True)(_gaussian_nb_kernel)
+
+
+def _compile_sklearn(model):
+    """Specialize a binary linear or Gaussian NB model into a numba predictor.
+
+    Returns a callable mapping a 2D float64 array to predicted class labels,
+    or None if numba is unavailable or the model type is not supported.
+    """
+    if njit is None:
+        return None
+    classes = model.classes_
+    if isinstance(model, (LogisticRegression, SVC)):
+        if len(classes) != 2 or (isinstance(model, SVC) and model.kernel != 'linear'):
+            return None
+        coef = np.ascontiguousarray(model.coef_[0], dtype=np.float64)
+        intercept = float(model.intercept_[0])
+
+        def predict_fn(X):
+            out = np.empty(X.shape[0], dtype=np.int64)
+            _linear_kernel(X, coef, intercept, out)
+            return classes[out]
+    elif isinstance(model, GaussianNB):
+        theta = np.ascontiguousarray(model.theta_, dtype=np.float64)
+        var = np.ascontiguousarray(model.var_, dtype=np.float64)
+        inv_var = 1.0 / var
+        const = np.log(model.class_prior_) - 0.5 * np.sum(np.log(2.0 * np.pi * var), axis=1)
+
+        def predict_fn(X):
+            out = np.empty(X.shape[0], dtype=np.int64)
+            _gaussian_nb_kernel(X, theta, inv_var, const, out)
+            return classes[out]
+    else:
+        return None
+    predict_fn(np.zeros((1, model.n_features_in_)))  # Compile once at load time
+    return predict_fn
+
+
+# Prebuilt treelite libraries for the random forests, written by `flask build-trees`
+TREE_LIB_DIR = os.getenv('TREE_LIB_DIR', os.path.join(app.instance_path, 'treelite'))
+
+
+def _tree_lib_path(path):
+    """Path of the prebuilt treelite library for a pickled random forest."""
+    return os.path.join(TREE_LIB_DIR, path.replace('/', '_') + '.so')
+
+
+def build_tree_lib(model, path):
+    """Compile a random forest to a native treelite library in TREE_LIB_DIR."""
+    os.makedirs(TREE_LIB_DIR, exist_ok=True)
+    tl2cgen.export_lib(
+        treelite.sklearn.import_model(model), toolchain='gcc', libpath=_tree_lib_path(path),
+        params={'parallel_comp': os.cpu_count() or 1}
+    )
+
+
+def _load_trees(model, path):
+    """Load the prebuilt treelite library for a random forest.
+
+    Returns a callable mapping a 2D array to predicted class labels, or None
+    if treelite is unavailable, the model is not a random forest, or no
+    up-to-date library has been built. Nothing is compiled here, so a
+    missing library never stalls a request.
+    """
+    if tl2cgen is None or not isinstance(model, RandomForestClassifier):
+        return None
+    libpath = _tree_lib_path(path)
+    try:
+        if os.path.getmtime(libpath) < os.path.getmtime(path):
+            logger.warning("Treelite library for %s is stale, using sklearn predict", path)
+            return None
+        predictor = tl2cgen.Predictor(libpath)
+    except Exception as e:
+        logger.info("No treelite library for %s, using sklearn predict: %s", path, e)
+        return None
+    classes = model.classes_
+
+    def predict_fn(X):
+        scores = predictor.predict(tl2cgen.DMatrix(X)).reshape(X.shape[0], -1)
+        if scores.shape[1] == 1:
+            return classes[(scores[:, 0] > 0.5).astype(np.int64)]
+        return classes[np.argmax(scores, axis=1)]
+    return predict_fn
+
+
+@app.cli.command('build-trees')
+def build_trees_command():
+    """Compile every random forest to a treelite library ahead of serving."""
+    if tl2cgen is None:
+        raise click.ClickException("treelite and tl2cgen are not installed")
+    for disease, files in MODEL_FILES.items():
+        path = files['RF']
+        try:
+            build_tree_lib(_pload(path), path)
+        except Exception as e:
+            click.echo(f"Skipped {disease}: {e}", err=True)
+        else:
+            click.echo(f"Built {_tree_lib_path(path)}")
+
+
+def _compile_dl(model):
+    """Trace a Keras model's forward pass once so predictions bypass Keras predict().
+
+    Returns a callable mapping a 2D array to a NumPy prediction array, or None
+    if TensorFlow is unavailable or the model is not a Keras model.
+    """
+    if tf is None or not isinstance(model, tf.keras.Model):
+        return None
+    try:
+        n_features = model.input_shape[-1]
+        infer = tf.function(
+            lambda x: model(x, training=False),
+            input_signature=[tf.TensorSpec([None, n_features], tf.float32)]
+        )
+        infer(tf.zeros([1, n_features]))  # Trace once at load time
+    except Exception as e:
+        logger.warning("Could not compile DL model, using Keras predict: %s", e)
+        return None
+    return lambda X: infer(tf.constant(X, dtype=tf.float32)).numpy()
+
+
+def _drain_queue(work_queue, max_batch):
+    """Block for one item, then take whatever is already queued, up to ``max_batch``.
+
+    Nothing waits for stragglers: a lone item is dispatched at once, and
+    batches form only from items that queued up while the worker was busy.
+    """
+    batch = [work_queue.get()]
+    while len(batch) < max_batch:
+        try:
+            batch.append(work_queue.get_nowait())
+        except queue.Empty:
+            break
+    return batch
+
+
+class BatchPredictor:
+    """Micro-batch single-sample predictions for one model.
+
+    Request threads enqueue scaled feature rows; a background worker takes up
+    to ``max_batch`` rows that have queued up, calls ``predict_fn`` once on
+    the stacked matrix and hands each row's prediction back through a
+    ``Future``.
+    """
+
+    def __init__(self, predict_fn, max_batch=32):
+        self.predict_fn = predict_fn
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._buffer = None
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def predict(self, features, timeout=30.0):
+        """Queue a single feature row and block until its prediction is ready."""
+        future = Future()
+        self._queue.put((features, future))
+        return future.result(timeout=timeout)
+
+    def _fill_buffer(self, batch):
+        """Copy the batch rows into the worker's reusable input matrix."""
+        n_features = len(batch[0][0])
+        if self._buffer is None or self._buffer.shape[1] != n_features:
+            self._buffer = np.empty((self.max_batch, n_features), dtype=np.float64)
+        for i, (features, _) in enumerate(batch):
+            self._buffer[i] = features
+        return self._buffer[:len(batch)]
+
+    def _predict(self, batch):
+        """Predict the batch rows in one call, returning one prediction per row."""
+        predictions = np.asarray(self.predict_fn(self._fill_buffer(batch)))
+        return predictions.reshape(len(batch), -1)[:, 0]
+
+    def _run(self):
+        """Worker loop: predict each collected batch in a single call."""
+        while True:
+            batch = _drain_queue(self._queue, self.max_batch)
+            try:
+                predictions = self._predict(batch)
+            except Exception:
+                self._predict_each(batch)
+                continue
+            for (_, future), prediction in zip(batch, predictions):
+                future.set_result(prediction)
+
+    def _predict_each(self, batch):
+        """Retry rows one at a time so a bad row doesn't fail the whole batch."""
+        for item in batch:
+            future = item[1]
+            try:
+                prediction = self._predict([item])[0]
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result(prediction)
+
+
+batch_predictors = {}
+_batch_predictors_lock = threading.Lock()
+
+
+def get_batch_predictor(disease, model_type):
+    """Get (or start) the batch predictor for a disease/model pair."""
+    key = (disease, model_type)
+    predictor = batch_predictors.get(key)
+    if predictor is None:
+        with _batch_predictors_lock:
+            predictor = batch_predictors.get(key)
+            if predictor is None:
+                model = get_model(disease, model_type)
+                # Prefer a compiled predictor (e.g. 'DL_fn') over the model's own predict()
+                predict_fn = models[disease].get(f'{model_type}_fn') or model.predict
+                predictor = BatchPredictor(predict_fn)
+                batch_predictors[key] = predictor
+    return predictor
 
 
 # Database Models
@@ -109,7 +473,9 @@ class Doctor(db.Model):
 
     def set_password(self, password):
         """Set password hash."""
-        self.password = generate_password_hash(password)
+        self.password = generate_password_hash(
+            password, method=app.config['PASSWORD_HASH_METHOD']
+        )
 
     def check_password(self, password):
         """Check password against stored hash."""
@@ -118,19 +484,53 @@ class Doctor(db.Model):
 
 class PatientData(db.Model):
     """PatientData model for storing patient health information."""
+    __table_args__ = (
+        # Upsert target; its (doctor_id, name, disease) prefix also serves history lookups
+        db.Index('uq_patient_doctor_name_disease_age', 'doctor_id', 'name', 'disease', 'age', unique=True),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     doctor_id = db.Column(db.Integer, db.ForeignKey('doctor.id'), nullable=False)
     name = db.Column(db.String(80), nullable=False)
     disease = db.Column(db.String(20), nullable=False)
     age = db.Column(db.Integer, nullable=True)
-    features = db.Column(db.PickleType, nullable=False)
+    features = db.Column(db.JSON, nullable=False)
     result = db.Column(db.Float, nullable=True)
     risk_label = db.Column(db.String(20), nullable=True)
 
 
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Use WAL journaling so reads don't block on concurrent writes."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.close()
+
+
+def _migrate_pickled_features():
+    """Rewrite feature dicts stored by the old PickleType column as JSON."""
+    rows = db.session.execute(db.text(
+        f"SELECT id, features FROM {PatientData.__tablename__} WHERE typeof(features) = 'blob'"
+    )).all()
+    for row_id, blob in rows:
+        # Round-trip through the app's JSON provider to turn NumPy scalars into plain values
+        features = app.json.loads(app.json.dumps(pickle.loads(blob)))
+        db.session.execute(
+            db.update(PatientData).where(PatientData.id == row_id).values(features=features)
+        )
+    db.session.commit()
+    if rows:
+        logger.info("Converted %d pickled patient feature rows to JSON", len(rows))
+
+
 # Initialize database
 with app.app_context():
+    event.listen(db.engine, 'connect', _set_sqlite_pragmas)
     db.create_all()
+    # create_all() skips existing tables, so add indexes missing from older databases
+    for index in PatientData.__table__.indexes:
+        index.create(db.engine, checkfirst=True)
+    _migrate_pickled_features()
     logger.info("Database initialized successfully")
 
 
@@ -159,6 +559,22 @@ FEATURE_LISTS = {
     ]
 }
 
+# Tuple views of the feature lists, iterated on every prediction request
+FEATURE_LISTS_TUPLE = {disease: tuple(features) for disease, features in FEATURE_LISTS.items()}
+
+
+# Per-thread scaled feature rows, reused across requests handled by the same thread
+_feature_buffers = {disease: threading.local() for disease in FEATURE_LISTS}
+
+
+def _feature_buffer(disease):
+    """Get this thread's preallocated feature row for a disease."""
+    local = _feature_buffers[disease]
+    buf = getattr(local, 'buf', None)
+    if buf is None:
+        buf = local.buf = np.empty(len(FEATURE_LISTS[disease]), dtype=np.float64)
+    return buf
+
 
 # Mapping of human-readable labels to numeric values
 LABEL_TO_NUMERIC = {
@@ -195,6 +611,17 @@ LABEL_TO_NUMERIC = {
     }
 }
 
+# Per-disease (feature, converter) pairs: a label lookup for categorical
+# features, float() for numeric ones
+CONVERTERS = {
+    disease: tuple(
+        (feature, LABEL_TO_NUMERIC[disease][feature].get
+         if feature in LABEL_TO_NUMERIC[disease] else float)
+        for feature in features
+    )
+    for disease, features in FEATURE_LISTS_TUPLE.items()
+}
+
 
 def get_gemini_recommendations(disease, patient_data):
     """Get recommendations from Gemini API based on disease and patient data."""
@@ -227,30 +654,153 @@ def get_gemini_recommendations(disease, patient_data):
         if not recommendations:
             raise ValueError("No valid recommendations received from Gemini API")
 
-        logger.info(f"Gemini API provided recommendations for {disease}")
+        logger.info("Gemini API provided recommendations for %s", disease)
         return recommendations
     except Exception as e:
-        logger.error(f"Gemini API error for {disease}: {str(e)}")
+        logger.error("Gemini API error for %s: %s", disease, e)
         return ["Unable to retrieve recommendations at this time."]
 
 
+def _get_doctor_id():
+    """Get the logged-in doctor's id, looking it up only if the session lacks it."""
+    doctor_id = session.get('doctor_id')
+    if doctor_id is None and 'username' in session:
+        doctor = Doctor.query.filter_by(username=session['username']).first()
+        if doctor:
+            doctor_id = session['doctor_id'] = doctor.id
+    return doctor_id
+
+
 def _get_patient_records(doctor_id, name, disease):
     """Get patient records for a given doctor, name, and disease."""
-    records = PatientData.query.filter_by(
-        doctor_id=doctor_id, name=name, disease=disease
+    rows = db.session.execute(
+        db.select(
+            PatientData.id, PatientData.age, PatientData.features,
+            PatientData.result, PatientData.risk_label
+        ).where(
+            PatientData.doctor_id == doctor_id,
+            PatientData.name == name,
+            PatientData.disease == disease
+        )
     ).all()
 
-    if records:
-        return [{
-            'id': r.id,
-            'age': r.age,
-            'features': r.features,
-            'result': r.result,
-            'risk_label': r.risk_label
-        } for r in records], False
+    if rows:
+        return [row._asdict() for row in rows], False
     return None, True
 
 
+def _patient_upsert(doctor_id, name, disease, age, features, result, risk_label):
+    """Build an INSERT ... ON CONFLICT DO UPDATE statement for a patient record."""
+    stmt = sqlite_insert(PatientData).values(
+        doctor_id=doctor_id,
+        name=name,
+        disease=disease,
+        age=age,
+        features=features,
+        result=float(result),
+        risk_label=risk_label
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=['doctor_id', 'name', 'disease', 'age'],
+        set_={
+            'features': stmt.excluded.features,
+            'result': stmt.excluded.result,
+            'risk_label': stmt.excluded.risk_label
+        }
+    )
+
+
+def _write_patient_record(doctor_id, name, disease, age, features, result, risk_label):
+    """Insert a patient record, or update the existing one, without committing.
+
+    SQLite's unique index treats NULLs as distinct, so ON CONFLICT never fires
+    for records without an age (e.g. breast cancer); those are matched with
+    an ``age IS NULL`` lookup and updated in place instead.
+    """
+    if age is not None:
+        db.session.execute(_patient_upsert(doctor_id, name, disease, age, features, result, risk_label))
+        return
+    existing = PatientData.query.filter_by(
+        doctor_id=doctor_id, name=name, disease=disease, age=None
+    ).first()
+    if existing is None:
+        db.session.add(PatientData(
+            doctor_id=doctor_id,
+            name=name,
+            disease=disease,
+            age=None,
+            features=features,
+            result=float(result),
+            risk_label=risk_label
+        ))
+    else:
+        existing.features = features
+        existing.result = float(result)
+        existing.risk_label = risk_label
+
+
+def _save_patient_record(doctor_id, name, disease, age, features, result, risk_label):
+    """Insert a patient record, or update the existing one, and commit."""
+    _write_patient_record(doctor_id, name, disease, age, features, result, risk_label)
+    db.session.commit()
+
+
+class PatientRecordWriter:
+    """Group patient record upserts from concurrent requests into shared commits.
+
+    Request threads submit records and get a ``Future`` back; a background
+    worker commits a lone record immediately, and groups up to ``max_batch``
+    records that queued up during the previous commit into one transaction.
+    """
+
+    def __init__(self, max_batch=64):
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def submit(self, **record):
+        """Queue a record upsert; the returned Future resolves once it is committed."""
+        if self._worker is None:
+            with self._lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, daemon=True)
+                    self._worker.start()
+        future = Future()
+        self._queue.put((record, future))
+        return future
+
+    def _run(self):
+        """Worker loop: commit each collected batch in one transaction."""
+        with app.app_context():
+            while True:
+                batch = _drain_queue(self._queue, self.max_batch)
+                try:
+                    for record, _ in batch:
+                        _write_patient_record(**record)
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    self._save_each(batch)
+                    continue
+                for _, future in batch:
+                    future.set_result(None)
+
+    def _save_each(self, batch):
+        """Retry records one at a time so a bad record doesn't fail the whole batch."""
+        for record, future in batch:
+            try:
+                _save_patient_record(**record)
+            except Exception as e:
+                db.session.rollback()
+                future.set_exception(e)
+            else:
+                future.set_result(None)
+
+
+patient_writer = PatientRecordWriter()
+
+
 def _classify_risk(prediction):
     """Classify risk based on prediction value."""
     if prediction >= 0.8:
@@ -261,6 +811,23 @@ def _classify_risk(prediction):
         return "Low Risk"
 
 
+def _render_disease_page(disease, name, prediction=None, error=None, **context):
+    """Render a disease page along with the named patient's record history."""
+    if name:
+        records, no_records = _get_patient_records(_get_doctor_id(), name, disease)
+    else:
+        records, no_records = None, False
+    return render_template(
+        f'{disease}.html',
+        prediction=prediction,
+        name=name,
+        error=error,
+        records=records,
+        no_records=no_records,
+        **context
+    )
+
+
 @app.route('/favicon.ico')
 def favicon():
     """Return empty response for favicon requests."""
@@ -284,23 +851,26 @@ def home():
             if doctor and doctor.check_password(password):
                 session['username'] = doctor.username
                 session['doctor_id'] = doctor.id
-                logger.info(f"Doctor {username} logged in successfully")
+                logger.info("Doctor %s logged in successfully", username)
                 return redirect(url_for('authenticated_home'))
             else:
                 error = "Invalid username or password"
-                logger.warning(f"Failed login attempt for username: {username}")
+                logger.warning("Failed login attempt for username: %s", username)
         elif action == 'Create Account':
-            if Doctor.query.filter_by(username=username).first():
+            new_doctor = Doctor(username=username)
+            new_doctor.set_password(password)
+            db.session.add(new_doctor)
+            try:
+                # The unique username constraint rejects duplicates without a prior SELECT
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback()
                 error = "Username already exists"
-                logger.warning(f"Attempt to create existing username: {username}")
+                logger.warning("Attempt to create existing username: %s", username)
             else:
-                new_doctor = Doctor(username=username)
-                new_doctor.set_password(password)
-                db.session.add(new_doctor)
-                db.session.commit()
                 session['username'] = username
                 session['doctor_id'] = new_doctor.id
-                logger.info(f"New doctor account created: {username}")
+                logger.info("New doctor account created: %s", username)
                 return redirect(url_for('authenticated_home'))
 
     return render_template('home.html', error=error)
@@ -326,25 +896,10 @@ def disease_page(disease):
     if 'username' not in session:
         return redirect(url_for('home'))
 
-    if disease not in models:
+    if disease not in MODEL_FILES:
         return redirect(url_for('authenticated_home'))
 
-    name = request.args.get('name', '')
-    records = None
-    no_records = False
-
-    if name:
-        doctor_id = session.get('doctor_id')
-        records, no_records = _get_patient_records(doctor_id, name, disease)
-
-    return render_template(
-        f'{disease}.html',
-        prediction=None,
-        name=name,
-        error=None,
-        records=records,
-        no_records=no_records
-    )
+    return _render_disease_page(disease, request.args.get('name', ''))
 
 
 @app.route('/search/<disease>', methods=['POST'])
@@ -357,15 +912,13 @@ def search_patient(disease):
     if not name:
         return jsonify({'records': None, 'no_records': True})
 
-    doctor_id = session.get('doctor_id')
+    doctor_id = _get_doctor_id()
     if not doctor_id:
         return jsonify({'records': None, 'no_records': True})
 
     records, no_records = _get_patient_records(doctor_id, name, disease)
     
-    print()
-    print(f"patient records of {name}", records)
-    print()
+    logger.debug("Patient records of %s: %s", name, records)
 
     return jsonify({
         'records': records,
@@ -379,11 +932,10 @@ def predict(disease):
     if 'username' not in session:
         return redirect(url_for('login'))
 
-    if disease not in models:
+    if disease not in MODEL_FILES:
         return redirect(url_for('authenticated_home'))
 
-    doctor_id = session.get('doctor_id')
-    doctor = Doctor.query.filter_by(id=doctor_id).first()
+    doctor_id = _get_doctor_id()
     model_type = request.form.get('model', 'RF')  # Default to Random Forest
     name = request.form.get('name', '')
 
@@ -392,28 +944,21 @@ def predict(disease):
     age = None
     error_message = None
 
-    #checking input data
-    print()
-    print("input data", request.form)
-    print()
+    logger.debug("Input data: %s", request.form)
 
-    for feature in FEATURE_LISTS[disease]:
+    for feature, convert in CONVERTERS[disease]:
         value = request.form.get(feature)
         if not value:
             error_message = f"Missing value for {feature}"
             break
 
-        if disease in LABEL_TO_NUMERIC and feature in LABEL_TO_NUMERIC[disease]:
-            value = LABEL_TO_NUMERIC[disease][feature].get(value, None)
-            if value is None:
-                error_message = f"Invalid value for {feature}"
-                break
-        else:
-            try:
-                value = float(value)
-            except ValueError:
-                error_message = f"Invalid value for {feature}"
-                break
+        try:
+            value = convert(value)
+        except ValueError:
+            value = None
+        if value is None:
+            error_message = f"Invalid value for {feature}"
+            break
 
         features.append(value)
         if feature.lower() in ['age', 'AGE']:
@@ -421,127 +966,63 @@ def predict(disease):
 
     # If there was an error in feature extraction
     if error_message:
-        records, no_records = _get_patient_records(doctor_id, name, disease) if name else (None, False)
-        return render_template(
-            f'{disease}.html',
-            prediction=None,
-            name=name,
-            error=error_message,
-            records=records,
-            no_records=no_records
-        )
+        return _render_disease_page(disease, name, error=error_message)
 
     # Scale features
     try:
-        scaler = models[disease]['scaler']
-        scaled_features = scaler.transform([features])[0]
-        logger.info(f"Features scaled for {disease} prediction")
+        get_model(disease, 'scaler')  # Also caches the scaler's affine
+        scaled_features = _scale_features(models[disease], features, out=_feature_buffer(disease))
+        logger.debug("Features scaled for %s prediction", disease)
     except Exception as e:
-        logger.error(f"Scaling error for {disease}: {str(e)}")
-        records, no_records = _get_patient_records(doctor_id, name, disease) if name else (None, False)
-        return render_template(
-            f'{disease}.html',
-            prediction=None,
-            name=name,
-            error="Error in scaling features",
-            records=records,
-            no_records=no_records
-        )
+        logger.error("Scaling error for %s: %s", disease, e)
+        return _render_disease_page(disease, name, error="Error in scaling features")
 
     # Make prediction
     try:
-        if model_type == 'DL':
-            model_input = np.array([scaled_features])
-            prediction = models[disease][model_type].predict(model_input)[0]
-            prediction = float(prediction)  # Convert to float for consistent type
-        else:
-            model_input = [scaled_features]
-            prediction = models[disease][model_type].predict(model_input)[0]
-
+        prediction = get_batch_predictor(disease, model_type).predict(scaled_features)
         prediction = float(prediction)  # Convert to float for consistent type
         prediction = 1.0 if prediction >= 0.5 else 0.0
 
-        logger.info(f"Prediction for {name} with {model_type}: {prediction}")
+        logger.debug("Prediction for %s with %s: %s", name, model_type, prediction)
     except Exception as e:
-        logger.error(f"Prediction error for {disease} with {model_type}: {str(e)}")
-        records, no_records = _get_patient_records(doctor_id, name, disease) if name else (None, False)
-        return render_template(
-            f'{disease}.html',
-            prediction=None,
+        logger.error("Prediction error for %s with %s: %s", disease, model_type, e)
+        return _render_disease_page(disease, name, error="Error in prediction")
+
+    risk_label = _classify_risk(prediction)
+
+    # Queue the patient record first so its commit overlaps the Gemini call
+    feature_dict = {feature: value for feature, value in zip(FEATURE_LISTS_TUPLE[disease], features)}
+    saved = None
+    if name:
+        logger.debug("Saving patient data for %s, disease: %s, doctor_id: %s, age: %s", name, disease, doctor_id, age)
+        saved = patient_writer.submit(
+            doctor_id=doctor_id,
             name=name,
-            error="Error in prediction",
-            records=records,
-            no_records=no_records
+            disease=disease,
+            age=age,
+            features=feature_dict,
+            result=prediction,
+            risk_label=risk_label
         )
 
     # Get recommendations for positive predictions
     recommendations = None
-    risk_label = _classify_risk(prediction)
-
     if prediction >= 0.5:  # Consider as positive prediction
         patient_data = {'age': age, 'features': features}
         recommendations = get_gemini_recommendations(disease, patient_data)
 
-    # Store or update patient data
-    feature_dict = {feature: value for feature, value in zip(FEATURE_LISTS[disease], features)}
-
-    print()
-    print(f"Saving patient data for {name}, disease: {disease}, doctor_id: {doctor_id}, age: {age}")
-    print()
-
-    if name:
+    # Wait for the record so the history below includes it
+    if saved is not None:
         try:
-            # Check if patient exists
-            patient = PatientData.query.filter_by(
-                doctor_id=doctor_id, name=name, disease=disease, age=age
-            ).first()
-
-            if patient:
-                print(f"Updating existing patient record: {patient.id}")
-                patient.features = feature_dict
-                patient.result = float(prediction)
-                patient.risk_label = risk_label
-            else:
-                print(f"Creating new patient record for {name}")
-                patient = PatientData(
-                    doctor_id=doctor_id,
-                    name=name,
-                    disease=disease,
-                    age=age,
-                    features=feature_dict,
-                    result=float(prediction),
-                    risk_label=risk_label
-                )
-                db.session.add(patient)
-            
-            db.session.commit()
-            print(f"Database commit successful for {name}")
-            
-            # Verify the record was saved
-            verification = PatientData.query.filter_by(
-                doctor_id=doctor_id, name=name, disease=disease, age=age
-            ).first()
-            
-            if verification:
-                print(f"Verified record exists with ID: {verification.id}")
-            else:
-                print("WARNING: Failed to verify record exists after save!")
-                
+            saved.result(timeout=30)
+            logger.debug("Database commit successful for %s", name)
         except Exception as e:
-            print(f"Error saving patient data: {str(e)}")
-            db.session.rollback()
-            logger.error(f"Database error: {str(e)}")
+            logger.error("Error saving patient data: %s", e)
 
-    # Fetch records for display
-    records, no_records = _get_patient_records(doctor_id, name, disease) if name else (None, False)
-
-    return render_template(
-        f'{disease}.html',
+    return _render_disease_page(
+        disease,
+        name,
         prediction=prediction,
-        name=name,
-        error=None,
-        records=records,
-        no_records=no_records,
         recommendations=recommendations,
         risk_label=risk_label
     )
@@ -551,4 +1032,4 @@ if __name__ == '__main__':
     try:
         app.run(host="0.0.0.0", port=5000, debug=True)
     except Exception as e:
-        logger.error(f"Application failed to start: {str(e)}")
+        logger.error("Application failed to start: %s", e)
@@ -0,0 +1,158 @@
+"""
+Shared pytest fixtures for the Medical Disease Prediction Flask Application tests.
+
+The schema is created once per session, and the seed rows the first time a
+test asks for ``seeded_db``; each test then runs inside a transaction that
+is rolled back afterwards.
+"""
+
+import os
+from functools import lru_cache
+from unittest.mock import MagicMock, patch
+
+# Must be set before the app module creates its engine. Flask-SQLAlchemy
+# serves ':memory:' through a StaticPool, so every connection in a process
+# shares one database; each xdist worker, being its own process, gets its own.
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+
+import numpy as np
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import scoped_session, sessionmaker
+from werkzeug.security import generate_password_hash
+
+
+# pysqlite's implicit transaction handling breaks SAVEPOINTs; let SQLAlchemy
+# emit BEGIN itself (see SQLAlchemy's pysqlite "Serializable isolation" recipe).
+# Registered before importing the app so its first connection is covered.
+@event.listens_for(Engine, 'connect')
+def _disable_pysqlite_begin(dbapi_connection, connection_record):
+    dbapi_connection.isolation_level = None
+
+
+@event.listens_for(Engine, 'begin')
+def _emit_begin(connection):
+    connection.exec_driver_sql('BEGIN')
+
+
+from app import app, db, Doctor, PatientData  # noqa: E402
+
+TEST_CONFIG = (
+    ('TESTING', True),
+    ('WTF_CSRF_ENABLED', False),
+    # A single PBKDF2 round keeps login-touching tests from being KDF-bound
+    ('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:1'),
+)
+
+# Hashed once at import rather than whenever the seed doctor is created
+TESTDOCTOR_HASH = generate_password_hash(
+    'testpassword', method=dict(TEST_CONFIG)['PASSWORD_HASH_METHOD']
+)
+
+
+def make_fake_model():
+    """A stand-in for an unpickled model that predicts class 0 for every row."""
+    return MagicMock(
+        predict=lambda X: np.zeros(len(X)),
+        predict_proba=lambda X: np.tile([[0.7, 0.3]], (len(X), 1)),
+    )
+
+
+@lru_cache(maxsize=None)
+def _make_app(config_key):
+    """Return the app with ``config_key`` applied, once per distinct config."""
+    app.config.update(dict(config_key))
+    return app
+
+
+@pytest.fixture(autouse=True, scope='session')
+def mock_pload():
+    """Serve fake models instead of unpickling the model files on disk."""
+    with patch('app._pload', side_effect=lambda path: make_fake_model()) as pload:
+        yield pload
+
+
+@pytest.fixture(autouse=True)
+def stub_gemini(monkeypatch):
+    """Keep every test offline by answering Gemini calls with canned text."""
+    fake = MagicMock()
+    fake.generate_content.return_value = MagicMock(text="1. r1\n2. r2")
+    monkeypatch.setattr('google.generativeai.GenerativeModel', lambda *args, **kwargs: fake)
+    return fake
+
+
+@pytest.fixture(scope='session')
+def app_fixture():
+    """Configure the app for testing and create the schema once per session."""
+    test_app = _make_app(TEST_CONFIG)
+
+    with test_app.app_context():
+        db.create_all()
+
+    yield test_app
+
+
+@pytest.fixture(scope='session')
+def seeded_db(app_fixture):
+    """Insert the test doctor and patient once, for the tests that rely on them."""
+    with app_fixture.app_context():
+        # Add test doctor (with a precomputed password hash) and patient data.
+        # The doctor's id is explicit so both rows go in with one commit.
+        test_doctor = Doctor(id=1, username='testdoctor', password=TESTDOCTOR_HASH)
+        test_patient = PatientData(
+            doctor_id=test_doctor.id,
+            name='Test Patient',
+            disease='heart-attack',
+            age=45,
+            features={'age': 45, 'sex': 1},
+            result=0.75,
+            risk_label="Medium Risk"
+        )
+        db.session.add_all([test_doctor, test_patient])
+        db.session.commit()
+        db.session.remove()
+
+
+@pytest.fixture(autouse=True)
+def app_ctx(app_fixture):
+    """Push one app context for the duration of each test."""
+    with app_fixture.app_context():
+        yield
+
+
+@pytest.fixture(autouse=True)
+def db_session(app_ctx):
+    """Run each test in an outer transaction that is rolled back on teardown.
+
+    The app's own commits only release SAVEPOINTs nested inside it.
+    """
+    connection = db.engine.connect()
+    transaction = connection.begin()
+    session = scoped_session(sessionmaker(
+        bind=connection, join_transaction_mode='create_savepoint'
+    ))
+    original_session = db.session
+    db.session = session
+
+    yield session
+
+    db.session = original_session
+    session.remove()
+    transaction.rollback()
+    connection.close()
+
+
+@pytest.fixture
+def client(app_fixture):
+    """A test client for the app."""
+    return _make_app(TEST_CONFIG).test_client()
+
+
+@pytest.fixture
+def logged_in_client(seeded_db, client):
+    """A test client whose session is logged in as the seeded test doctor."""
+    with client.session_transaction() as sess:
+        sess['username'] = 'testdoctor'
+        sess['doctor_id'] = 1
+    return client
@@ -5,415 +5,558 @@ This module contains comprehensive test cases for testing the functionality
 of the Flask application for medical disease prediction.
 """
 
-import unittest
 import os
+import pickle
+import tempfile
+import threading
+import time
 import numpy as np
+import pytest
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import patch, MagicMock
-from flask import session
-from werkzeug.security import generate_password_hash, check_password_hash
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.naive_bayes import GaussianNB
+from sklearn.preprocessing import MinMaxScaler, StandardScaler
+from sqlalchemy import tuple_
 
 # Import the Flask application
 from app import (
-    app, db, Doctor, PatientData, load_model_files,
+    app, db, Doctor, PatientData, load_model_files, get_model, MODEL_FILES,
     FEATURE_LISTS, LABEL_TO_NUMERIC, _classify_risk,
-    _get_patient_records, get_gemini_recommendations
+    _get_patient_records, _save_patient_record, get_gemini_recommendations, BatchPredictor,
+    PatientRecordWriter, _migrate_pickled_features,
+    _scaler_affine, _scale_features, _compile_sklearn, njit,
+    _load_trees, build_tree_lib, tl2cgen
 )
 
 
-class FlaskMedicalAppTests(unittest.TestCase):
-    """Unit tests for the Medical Disease Prediction Flask Application."""
-
-    def setUp(self):
-        """Set up test environment before each test."""
-        # Configure the Flask app for testing
-        app.config['TESTING'] = True
-        app.config['WTF_CSRF_ENABLED'] = False
-        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
-        self.app = app.test_client()
-
-        # Create the database and tables
-        with app.app_context():
-            db.create_all()
-
-            # Add test doctor with encrypted password
-            test_doctor = Doctor(username='testdoctor')
-            test_doctor.set_password('testpassword')
-            db.session.add(test_doctor)
-            db.session.commit()
-
-            # Add test patient data
-            test_patient = PatientData(
-                doctor_id=1,
-                name='Test Patient',
-                disease='heart-attack',
-                age=45,
-                features={'age': 45, 'sex': 1},
-                result=0.75,
-                risk_label="Medium Risk"
+@pytest.mark.parametrize('path, needle', [
+    ('/', b'MediScope AI'),
+    # Pages behind the login redirect anonymous users back to the login form
+    ('/authenticated_home', b'Login'),
+    ('/heart-attack', b'Login'),
+])
+def test_public_routes(client, path, needle):
+    """Test that pages reachable without a session render (or redirect to login)."""
+    response = client.get(path, follow_redirects=True)
+    assert response.status_code == 200
+    assert needle in response.data
+
+
+@pytest.mark.usefixtures('seeded_db')
+def test_successful_login(client):
+    """Test successful login with valid credentials."""
+    response = client.post('/', data={
+        'username': 'testdoctor',
+        'password': 'testpassword',
+        'action': 'Login'
+    }, follow_redirects=True)
+    assert response.status_code == 200
+    assert b'authenticated_home' in response.data.lower()
+
+
+@pytest.mark.usefixtures('seeded_db')
+def test_failed_login(client):
+    """Test failed login with invalid credentials."""
+    response = client.post('/', data={
+        'username': 'testdoctor',
+        'password': 'wrongpassword',
+        'action': 'Login'
+    }, follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Invalid username or password' in response.data
+
+
+def test_create_account(client):
+    """Test creating a new account."""
+    response = client.post('/', data={
+        'username': 'newdoctor',
+        'password': 'newpassword',
+        'action': 'Create Account'
+    }, follow_redirects=True)
+    assert response.status_code == 200
+
+    doctor = Doctor.query.filter_by(username='newdoctor').first()
+    assert doctor is not None
+    assert doctor.check_password('newpassword')
+
+
+@pytest.mark.usefixtures('seeded_db')
+def test_create_duplicate_account(client):
+    """Test creating an account with existing username."""
+    response = client.post('/', data={
+        'username': 'testdoctor',
+        'password': 'any',
+        'action': 'Create Account'
+    }, follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Username already exists' in response.data
+
+
+def test_logout(logged_in_client):
+    """Test logout functionality."""
+    response = logged_in_client.get('/logout', follow_redirects=True)
+    assert response.status_code == 200
+    assert b'MediScope AI' in response.data
+
+    # Verify session is cleared
+    with logged_in_client.session_transaction() as sess:
+        assert 'username' not in sess
+        assert 'doctor_id' not in sess
+
+
+def test_authenticated_home_with_session(logged_in_client):
+    """Test authenticated home page with valid session."""
+    response = logged_in_client.get('/authenticated_home')
+    assert response.status_code == 200
+    assert b'authenticated_home' in response.data.lower()
+
+
+@pytest.mark.parametrize('disease', ['heart-attack', 'breast-cancer', 'diabetes', 'lung-cancer'])
+def test_disease_page_with_session(logged_in_client, disease):
+    """Test disease prediction page with valid session."""
+    response = logged_in_client.get(f'/{disease}')
+    assert response.status_code == 200
+    assert disease.encode() in response.data.lower()
+
+
+def test_disease_page_with_patient_name(logged_in_client):
+    """Test disease page with patient name parameter."""
+    response = logged_in_client.get('/heart-attack?name=Test%20Patient')
+    assert response.status_code == 200
+    # Check if the page contains patient data section
+    assert b'patient' in response.data.lower()
+
+
+def test_password_security():
+    """Test that passwords are stored securely (TC_F1.3.1)."""
+    # Create a doctor user with password that should be hashed
+    test_doctor = Doctor(username='securitytest')
+    test_doctor.set_password('testpassword')
+    db.session.add(test_doctor)
+    db.session.commit()
+
+    # Verify password is hashed in database
+    doctor = Doctor.query.filter_by(username='securitytest').first()
+
+    # Check password is not stored in plaintext
+    assert doctor.password != 'testpassword'
+    assert doctor.password.startswith('pbkdf2:sha256:1$')
+
+    # Verify the password can be checked against the hash
+    assert doctor.check_password('testpassword')
+    assert not doctor.check_password('wrongpassword')
+
+
+def test_model_loading(mock_pload):
+    """Test that models are loaded correctly at application startup."""
+    mock_pload.reset_mock()
+    models = load_model_files()
+
+    # Every configured file is read exactly once
+    assert mock_pload.call_count == sum(len(files) for files in MODEL_FILES.values())
+
+    # Verify all expected diseases are loaded
+    assert 'heart-attack' in models
+    assert 'breast-cancer' in models
+    assert 'diabetes' in models
+    assert 'lung-cancer' in models
+
+    # Verify each disease has all required model types
+    for disease in models:
+        assert 'scaler' in models[disease]
+        assert 'KNN' in models[disease]
+        assert 'DT' in models[disease]
+        assert 'RF' in models[disease]
+        assert 'LR' in models[disease]
+        assert 'SVM' in models[disease]
+        assert 'NB' in models[disease]
+        assert 'DL' in models[disease]
+
+        # Check that quantum models exist where implemented
+        if disease in ['heart-attack', 'diabetes', 'lung-cancer']:
+            assert 'QNN' in models[disease]
+
+
+def test_lazy_model_loading(mock_pload):
+    """Test that models are unpickled on first use and then cached."""
+    with patch('app.models', {}) as cache:
+        mock_pload.reset_mock()
+
+        model = get_model('diabetes', 'RF')
+        mock_pload.assert_called_once_with(MODEL_FILES['diabetes']['RF'])
+        assert list(cache) == ['diabetes']
+
+        assert get_model('diabetes', 'RF') is model
+        assert mock_pload.call_count == 1
+
+
+def test_search_patient(logged_in_client):
+    """Test the search_patient functionality."""
+    # Test with existing patient
+    response = logged_in_client.post('/search/heart-attack', data={'name': 'Test Patient'})
+    assert response.status_code == 200
+    data = response.get_json()
+    assert not data['no_records']
+    assert len(data['records']) > 0
+        
+    # Test with non-existent patient
+    response = logged_in_client.post('/search/heart-attack', data={'name': 'Nonexistent'})
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['no_records']
+    assert data['records'] is None
+
+
+@pytest.mark.usefixtures('seeded_db')
+def test_search_patient_without_doctor_id(client):
+    """Test that search falls back to a username lookup for the doctor id."""
+    with client.session_transaction() as sess:
+        sess['username'] = 'testdoctor'
+
+    response = client.post('/search/heart-attack', data={'name': 'Test Patient'})
+    assert response.status_code == 200
+    data = response.get_json()
+    assert not data['no_records']
+
+    with client.session_transaction() as sess:
+        assert sess['doctor_id'] == 1
+
+
+# A valid submission per disease, as the strings a browser would post: the
+# first label for categorical fields and '1' for every numeric one
+PREDICTION_FORMS = {
+    disease: {
+        feature: next(iter(LABEL_TO_NUMERIC[disease][feature]))
+        if feature in LABEL_TO_NUMERIC.get(disease, {}) else '1'
+        for feature in features
+    }
+    for disease, features in FEATURE_LISTS.items()
+}
+
+
+def test_model_predictions(logged_in_client):
+    """Test model predictions with sample data for each disease."""
+    diseases = ['heart-attack', 'breast-cancer', 'diabetes', 'lung-cancer']
+
+    # A positive case predicted by DT and a negative case predicted by KNN per disease
+    cases = []
+    fake_models = {}
+    for disease in diseases:
+        # Identity affine so the scaler is bypassed
+        fake_models[disease] = {'scaler': MagicMock(), 'scaler_affine': (1.0, 0.0, None)}
+        for model_type, expected, risk_label in (('DT', 1.0, 'High Risk'), ('KNN', 0.0, 'Low Risk')):
+            fake_models[disease][model_type] = MagicMock(
+                predict=MagicMock(side_effect=lambda X, e=expected: np.full(len(X), e))
             )
-            db.session.add(test_patient)
-            db.session.commit()
-
-    def tearDown(self):
-        """Clean up after each test."""
-        with app.app_context():
-            db.session.remove()
-            db.drop_all()
-
-    def test_home_page(self):
-        """Test that home page loads correctly."""
-        response = self.app.get('/')
-        self.assertEqual(response.status_code, 200)
-        self.assertIn(b'MediScope AI', response.data)
-
-    def test_successful_login(self):
-        """Test successful login with valid credentials."""
-        response = self.app.post('/', data={
-            'username': 'testdoctor',
-            'password': 'testpassword',
-            'action': 'Login'
-        }, follow_redirects=True)
-        self.assertEqual(response.status_code, 200)
-        self.assertIn(b'authenticated_home', response.data.lower())
-
-    def test_failed_login(self):
-        """Test failed login with invalid credentials."""
-        response = self.app.post('/', data={
-            'username': 'testdoctor',
-            'password': 'wrongpassword',
-            'action': 'Login'
-        }, follow_redirects=True)
-        self.assertEqual(response.status_code, 200)
-        self.assertIn(b'Invalid username or password', response.data)
-
-    def test_create_account(self):
-        """Test creating a new account."""
-        response = self.app.post('/', data={
-            'username': 'newdoctor',
-            'password': 'newpassword',
-            'action': 'Create Account'
-        }, follow_redirects=True)
-        self.assertEqual(response.status_code, 200)
-
-        with app.app_context():
-            doctor = Doctor.query.filter_by(username='newdoctor').first()
-            self.assertIsNotNone(doctor)
-            self.assertTrue(doctor.check_password('newpassword'))
-
-    def test_create_duplicate_account(self):
-        """Test creating an account with existing username."""
-        response = self.app.post('/', data={
-            'username': 'testdoctor',
-            'password': 'any',
-            'action': 'Create Account'
-        }, follow_redirects=True)
-        self.assertEqual(response.status_code, 200)
-        self.assertIn(b'Username already exists', response.data)
-
-    def test_logout(self):
-        """Test logout functionality."""
-        # Login first
-        with self.app as client:
-            with client.session_transaction() as sess:
-                sess['username'] = 'testdoctor'
-                sess['doctor_id'] = 1
-
-            # Then logout
-            response = client.get('/logout', follow_redirects=True)
-            self.assertEqual(response.status_code, 200)
-            self.assertIn(b'MediScope AI', response.data)
-
-            # Verify session is cleared
-            with client.session_transaction() as sess:
-                self.assertNotIn('username', sess)
-                self.assertNotIn('doctor_id', sess)
-
-    def test_authenticated_home_with_session(self):
-        """Test authenticated home page with valid session."""
-        with self.app as client:
-            with client.session_transaction() as sess:
-                sess['username'] = 'testdoctor'
-                sess['doctor_id'] = 1
-
-            response = client.get('/authenticated_home')
-            self.assertEqual(response.status_code, 200)
-            self.assertIn(b'authenticated_home', response.data.lower())
-
-    def test_authenticated_home_without_session(self):
-        """Test that authenticated home redirects to login when no session."""
-        response = self.app.get('/authenticated_home', follow_redirects=True)
-        self.assertEqual(response.status_code, 200)
-        self.assertIn(b'Login', response.data)
-
-    def test_disease_page_with_session(self):
-        """Test disease prediction page with valid session."""
-        # First mock the models to avoid loading actual files
-        with patch('app.models', {'heart-attack': {}, 'breast-cancer': {}, 'diabetes': {}, 'lung-cancer': {}}):
-            with self.app as client:
-                with client.session_transaction() as sess:
-                    sess['username'] = 'testdoctor'
-                    sess['doctor_id'] = 1
-
-                # Test each available disease page
-                for disease in ['heart-attack', 'breast-cancer', 'diabetes', 'lung-cancer']:
-                    with self.subTest(disease=disease):
-                        response = client.get(f'/{disease}')
-                        self.assertEqual(response.status_code, 200)
-                        self.assertIn(disease.encode(), response.data.lower())
-
-    def test_disease_page_without_session(self):
-        """Test that disease page redirects to login when no session."""
-        response = self.app.get('/heart-attack', follow_redirects=True)
-        self.assertEqual(response.status_code, 200)
-        self.assertIn(b'Login', response.data)
-
-    def test_disease_page_with_patient_name(self):
-        """Test disease page with patient name parameter."""
-        # Mock the models
-        with patch('app.models', {'heart-attack': {}, 'breast-cancer': {}, 'diabetes': {}, 'lung-cancer': {}}):
-            with self.app as client:
-                with client.session_transaction() as sess:
-                    sess['username'] = 'testdoctor'
-                    sess['doctor_id'] = 1
-
-                response = client.get('/heart-attack?name=Test%20Patient')
-                self.assertEqual(response.status_code, 200)
-                # Check if the page contains patient data section
-                self.assertIn(b'patient', response.data.lower())
-
-    def test_password_security(self):
-        """Test that passwords are stored securely (TC_F1.3.1)."""
-        with app.app_context():
-            # Create a doctor user with password that should be hashed
-            test_doctor = Doctor(username='securitytest')
-            test_doctor.set_password('testpassword')
-            db.session.add(test_doctor)
-            db.session.commit()
-
-            # Verify password is hashed in database
-            doctor = Doctor.query.filter_by(username='securitytest').first()
-
-            # Check password is not stored in plaintext
-            self.assertNotEqual(doctor.password, 'testpassword')
-
-            # Verify the password can be checked against the hash
-            self.assertTrue(doctor.check_password('testpassword'))
-            self.assertFalse(doctor.check_password('wrongpassword'))
-
-    def test_model_loading(self):
-        """Test that models are loaded correctly at application startup."""
-        with patch('pickle.load') as mock_pickle:
-            # Setup mock models
-            mock_model = MagicMock()
-            mock_pickle.return_value = mock_model
-
-            # Call the load function
-            models = load_model_files()
-
-            # Verify all expected diseases are loaded
-            self.assertIn('heart-attack', models)
-            self.assertIn('breast-cancer', models)
-            self.assertIn('diabetes', models)
-            self.assertIn('lung-cancer', models)
-
-            # Verify each disease has all required model types
-            for disease in models:
-                self.assertIn('scaler', models[disease])
-                self.assertIn('KNN', models[disease])
-                self.assertIn('DT', models[disease])
-                self.assertIn('RF', models[disease])
-                self.assertIn('LR', models[disease])
-                self.assertIn('SVM', models[disease])
-                self.assertIn('NB', models[disease])
-                self.assertIn('DL', models[disease])
-                
-                # Check that quantum models exist where implemented
-                if disease in ['heart-attack', 'diabetes', 'lung-cancer']:
-                    self.assertIn('QNN', models[disease])
-
-    def test_search_patient(self):
-        """Test the search_patient functionality."""
-        with self.app as client:
-            with client.session_transaction() as sess:
-                sess['username'] = 'testdoctor'
-                sess['doctor_id'] = 1
-
-            # Test with existing patient
-            response = client.post('/search/heart-attack', data={'name': 'Test Patient'})
-            self.assertEqual(response.status_code, 200)
-            data = response.get_json()
-            self.assertFalse(data['no_records'])
-            self.assertTrue(len(data['records']) > 0)
-            
-            # Test with non-existent patient
-            response = client.post('/search/heart-attack', data={'name': 'Nonexistent'})
-            self.assertEqual(response.status_code, 200)
-            data = response.get_json()
-            self.assertTrue(data['no_records'])
-            self.assertIsNone(data['records'])
-
-    def test_model_predictions(self):
-        """Test model predictions with sample data for each disease."""
-        # Mock models to return specific predictions based on our test cases
-        with patch('app.models') as mock_models:
-            # Setup mock models structure
-            mock_models.return_value = {
-                'heart-attack': {
-                    'scaler': MagicMock(),
-                    'DT': MagicMock(),
-                    'KNN': MagicMock(),
-                    'LR': MagicMock()
-                },
-                'breast-cancer': {
-                    'scaler': MagicMock(),
-                    'DT': MagicMock()
-                },
-                'diabetes': {
-                    'scaler': MagicMock(),
-                    'DT': MagicMock(),
-                    'LR': MagicMock()
-                },
-                'lung-cancer': {
-                    'scaler': MagicMock(),
-                    'DT': MagicMock(),
-                    'KNN': MagicMock()
-                }
-            }
-
-            # Configure scaler to return input as-is (identity transform)
-            for disease in ['heart-attack', 'breast-cancer', 'diabetes', 'lung-cancer']:
-                mock_models.return_value[disease]['scaler'].transform.return_value = [1]*len(FEATURE_LISTS[disease])
-
-            # Test cases for each disease (same as before)
-            test_cases = [
-                # ... (keep all your existing test cases here)
-            ]
-
-            with self.app as client:
-                # Start a session transaction and set up the session
-                with client.session_transaction() as sess:
-                    sess['username'] = 'testdoctor'
-                    sess['doctor_id'] = 1
-
-                # Now make requests within this client context
-                for case in test_cases:
-                    disease = case['disease']
-                    
-                    # Test positive case
-                    pos_case = case['positive']
-                    mock_models.return_value[disease][pos_case['model']].predict.return_value = [pos_case['expected']]
-                    
-                    # Prepare form data
-                    form_data = {'name': f'test_{disease}_positive', 'model': pos_case['model']}
-                    form_data.update(pos_case['data'])
-                    
-                    # Make the request with follow_redirects=True to handle any redirects
-                    response = client.post(
-                        f'/predict/{disease}',
-                        data=form_data,
-                        follow_redirects=True
-                    )
-                    self.assertEqual(response.status_code, 200)
-                    
-                    # Check prediction and risk label in the response data
-                    self.assertIn(f'prediction": {pos_case["expected"]}'.encode(), response.data)
-                    self.assertIn(f'risk_label": "{pos_case["risk_label"]}"'.encode(), response.data)
-                    
-                    # Verify correct model was called
-                    mock_models.return_value[disease][pos_case['model']].predict.assert_called_once()
-                    mock_models.return_value[disease][pos_case['model']].reset_mock()
-                    
-                    # Test negative case
-                    neg_case = case['negative']
-                    mock_models.return_value[disease][neg_case['model']].predict.return_value = [neg_case['expected']]
-                    
-                    # Prepare form data
-                    form_data = {'name': f'test_{disease}_negative', 'model': neg_case['model']}
-                    form_data.update(neg_case['data'])
-                    
-                    # Make the request with follow_redirects=True
-                    response = client.post(
-                        f'/predict/{disease}',
-                        data=form_data,
-                        follow_redirects=True
-                    )
-                    self.assertEqual(response.status_code, 200)
-                    
-                    # Check prediction and risk label
-                    self.assertIn(f'prediction": {neg_case["expected"]}'.encode(), response.data)
-                    self.assertIn(f'risk_label": "{neg_case["risk_label"]}"'.encode(), response.data)
-                    
-                    # Verify correct model was called
-                    mock_models.return_value[disease][neg_case['model']].predict.assert_called_once()
-                    mock_models.return_value[disease][neg_case['model']].reset_mock()
-
-    def test_risk_classification(self):
-        """Test the risk classification function."""
-        # Test high risk
-        self.assertEqual(_classify_risk(0.85), "High Risk")
-
-        # Test medium risk
-        self.assertEqual(_classify_risk(0.75), "Medium Risk")
-        self.assertEqual(_classify_risk(0.5), "Medium Risk")
-
-        # Test low risk
-        self.assertEqual(_classify_risk(0.49), "Low Risk")
-        self.assertEqual(_classify_risk(0.0), "Low Risk")
-
-    def test_patient_record_retrieval(self):
-        """Test retrieval of patient records."""
-        # Test the _get_patient_records function directly
-        with app.app_context():
-            # Existing patient
-            records, no_records = _get_patient_records(1, 'Test Patient', 'heart-attack')
-            self.assertFalse(no_records)
-            self.assertIsNotNone(records)
-            self.assertEqual(len(records), 1)
-            self.assertEqual(records[0]['risk_label'], 'Medium Risk')
-            
-            # Non-existent patient
-            records, no_records = _get_patient_records(1, 'Nonexistent', 'heart-attack')
-            self.assertTrue(no_records)
-            self.assertIsNone(records)
-
-    def test_gemini_recommendations(self):
-        """Test Gemini recommendations generation (mocked)."""
-        with patch('google.generativeai.GenerativeModel') as mock_model:
-            # Setup mock response
-            mock_response = MagicMock()
-            mock_response.text = "1. Recommendation one\n2. Recommendation two"
-            mock_model.return_value.generate_content.return_value = mock_response
-
-            # Call the function
-            recommendations = get_gemini_recommendations('heart-attack', {'age': 50})
-
-            # Verify the response
-            self.assertEqual(len(recommendations), 2)
-            self.assertEqual(recommendations[0], "Recommendation one")
-            self.assertEqual(recommendations[1], "Recommendation two")
-
-    def test_feature_lists(self):
-        """Test that feature lists are properly defined."""
-        self.assertIn('heart-attack', FEATURE_LISTS)
-        self.assertIn('breast-cancer', FEATURE_LISTS)
-        self.assertIn('diabetes', FEATURE_LISTS)
-        self.assertIn('lung-cancer', FEATURE_LISTS)
-
-        # Verify some key features for each disease
-        self.assertIn('age', FEATURE_LISTS['heart-attack'])
-        self.assertIn('radius_mean', FEATURE_LISTS['breast-cancer'])
-        self.assertIn('Glucose', FEATURE_LISTS['diabetes'])
-        self.assertIn('SMOKING', FEATURE_LISTS['lung-cancer'])
-
-    def test_label_to_numeric_mappings(self):
-        """Test that label to numeric mappings are properly defined."""
-        self.assertIn('heart-attack', LABEL_TO_NUMERIC)
-        self.assertIn('lung-cancer', LABEL_TO_NUMERIC)
-
-        # Verify some key mappings
-        self.assertEqual(LABEL_TO_NUMERIC['heart-attack']['sex']['male'], 1)
-        self.assertEqual(LABEL_TO_NUMERIC['lung-cancer']['GENDER']['M'], 1)
-
-
-if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+            name = f'test_{disease}_{model_type}'
+            form_data = dict(PREDICTION_FORMS[disease], name=name, model=model_type)
+            cases.append((disease, model_type, form_data, name, expected, risk_label))
+
+    with patch('app.models', fake_models), patch('app.batch_predictors', {}):
+        for disease, _, form_data, _, _, _ in cases:
+            response = logged_in_client.post(f'/predict/{disease}', data=form_data, follow_redirects=True)
+            assert response.status_code == 200
+            assert b'Error in' not in response.data
+
+    # Verify the correct model was called for each case
+    for disease, model_type, _, _, _, _ in cases:
+        fake_models[disease][model_type].predict.assert_called_once()
+
+    # Fetch every saved record in one row-value IN query
+    expected_keys = [(name, disease) for disease, _, _, name, _, _ in cases]
+    records = {
+        record.name: record
+        for record in PatientData.query.filter(
+            PatientData.doctor_id == 1,
+            tuple_(PatientData.name, PatientData.disease).in_(expected_keys)
+        )
+    }
+    assert len(records) == len(cases)
+    for _, _, _, name, expected, risk_label in cases:
+        assert records[name].result == expected
+        assert records[name].risk_label == risk_label
+
+
+def test_predict_invalid_input(logged_in_client):
+    """Test that missing and unmapped form values are reported."""
+    form_data = {feature: '1' for feature in FEATURE_LISTS['heart-attack']}
+    response = logged_in_client.post('/predict/heart-attack', data=form_data)
+    assert b'Invalid value for sex' in response.data
+
+    form_data.update({'sex': 'male', 'cp': 'asymptomatic', 'trestbps': ''})
+    response = logged_in_client.post('/predict/heart-attack', data=form_data)
+    assert b'Missing value for trestbps' in response.data
+
+    form_data['trestbps'] = 'abc'
+    response = logged_in_client.post('/predict/heart-attack', data=form_data)
+    assert b'Invalid value for trestbps' in response.data
+
+
+class _Gate:
+    """Hold a fake model's first call until the test releases it."""
+
+    def __init__(self):
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def wait(self):
+        self.entered.set()
+        self.release.wait(timeout=10)
+
+
+def _submit_behind_running_call(executor, predictor, gate, rows):
+    """Submit ``rows[0]``, then queue the other rows while the worker is held in its call.
+
+    Returns one future per row; ``gate`` is released once all rows are queued.
+    """
+    futures = [executor.submit(predictor.predict, rows[0])]
+    gate.entered.wait(timeout=10)
+    futures += [executor.submit(predictor.predict, row) for row in rows[1:]]
+    while predictor._queue.qsize() < len(rows) - 1:
+        time.sleep(0.001)
+    gate.release.set()
+    return futures
+
+
+def test_batch_predictor():
+    """Test that rows queued behind a running prediction share one predict call."""
+    gate = _Gate()
+    calls = []
+
+    def predict_fn(X):
+        calls.append(len(X))
+        gate.wait()
+        return X[:, :1] * 2
+
+    predictor = BatchPredictor(predict_fn, max_batch=4)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = _submit_behind_running_call(executor, predictor, gate, [[i, 0.0] for i in range(4)])
+        results = [future.result(timeout=10) for future in futures]
+
+    assert [float(r) for r in results] == [0.0, 2.0, 4.0, 6.0]
+    # The first row runs alone; the three queued behind it go in one call
+    assert calls == [1, 3]
+
+
+def test_batch_predictor_isolates_bad_rows():
+    """Test that a row the model rejects only fails its own request."""
+    gate = _Gate()
+
+    def predict_fn(X):
+        gate.wait()
+        if np.isnan(X).any():
+            raise ValueError("Input contains NaN")
+        return X[:, :1]
+
+    predictor = BatchPredictor(predict_fn)
+    rows = [[5.0, 0.0], [0.0, 0.0], [float('nan'), 0.0], [1.0, 1.0]]
+    with ThreadPoolExecutor(max_workers=len(rows)) as executor:
+        futures = _submit_behind_running_call(executor, predictor, gate, rows)
+
+        assert float(futures[0].result(timeout=10)) == 5.0
+        assert float(futures[1].result(timeout=10)) == 0.0
+        with pytest.raises(ValueError):
+            futures[2].result(timeout=10)
+        assert float(futures[3].result(timeout=10)) == 1.0
+
+
+def test_batch_predictor_error():
+    """Test that model errors are raised in the calling thread."""
+    model = MagicMock()
+    model.predict.side_effect = ValueError("bad input")
+    predictor = BatchPredictor(model.predict)
+
+    with pytest.raises(ValueError):
+        predictor.predict([1.0, 2.0])
+
+
+def test_scale_features_matches_scaler():
+    """Test that the cached scaler affine matches sklearn's transform."""
+    data = np.array([[1.0, 10.0], [3.0, 50.0], [5.0, 30.0]])
+    scalers = (
+        MinMaxScaler().fit(data),
+        StandardScaler().fit(data),
+        StandardScaler(with_mean=False).fit(data),
+        StandardScaler(with_std=False).fit(data),
+        StandardScaler(with_mean=False, with_std=False).fit(data),
+    )
+    for scaler in scalers:
+        disease_models = {'scaler': scaler, 'scaler_affine': _scaler_affine(scaler)}
+        features = [2.0, 20.0]
+        np.testing.assert_allclose(
+            _scale_features(disease_models, features),
+            scaler.transform([features])[0]
+        )
+
+
+@pytest.mark.skipif(njit is None, reason="numba is not installed")
+def test_compiled_sklearn_matches_predict():
+    """Test that numba-specialized LR and NB models match sklearn's predict."""
+    rng = np.random.default_rng(0)
+    X = rng.random((200, 5))
+    y = (X[:, 0] + X[:, 1] > 1).astype(int)
+    for model in (LogisticRegression().fit(X, y), GaussianNB().fit(X, y)):
+        predict_fn = _compile_sklearn(model)
+        np.testing.assert_array_equal(predict_fn(X), model.predict(X))
+
+
+@pytest.mark.skipif(tl2cgen is None, reason="treelite is not installed")
+def test_compiled_trees_match_predict():
+    """Test that a prebuilt treelite random forest matches sklearn's predict."""
+    rng = np.random.default_rng(0)
+    X = rng.random((200, 4))
+    y = (X[:, 0] > X[:, 1]).astype(int)
+    model = RandomForestClassifier(n_estimators=5, max_depth=4, random_state=0).fit(X, y)
+
+    with tempfile.TemporaryDirectory() as tmp, patch('app.TREE_LIB_DIR', os.path.join(tmp, 'lib')):
+        path = os.path.join(tmp, 'RF_model')
+        open(path, 'wb').close()
+
+        # Loading never compiles; without a built library it falls back
+        assert _load_trees(model, path) is None
+
+        build_tree_lib(model, path)
+        predict_fn = _load_trees(model, path)
+        assert predict_fn is not None
+        np.testing.assert_array_equal(predict_fn(X), model.predict(X))
+
+
+def test_risk_classification():
+    """Test the risk classification function."""
+    # Test high risk
+    assert _classify_risk(0.85) == "High Risk"
+
+    # Test medium risk
+    assert _classify_risk(0.75) == "Medium Risk"
+    assert _classify_risk(0.5) == "Medium Risk"
+
+    # Test low risk
+    assert _classify_risk(0.49) == "Low Risk"
+    assert _classify_risk(0.0) == "Low Risk"
+
+
+@pytest.mark.usefixtures('seeded_db')
+def test_patient_record_retrieval():
+    """Test retrieval of patient records."""
+    # Test the _get_patient_records function directly
+    # Existing patient
+    records, no_records = _get_patient_records(1, 'Test Patient', 'heart-attack')
+    assert not no_records
+    assert records is not None
+    assert len(records) == 1
+    assert records[0]['risk_label'] == 'Medium Risk'
+        
+    # Non-existent patient
+    records, no_records = _get_patient_records(1, 'Nonexistent', 'heart-attack')
+    assert no_records
+    assert records is None
+
+
+def test_save_patient_record_upsert():
+    """Test that saving the same patient twice updates a single record."""
+    _save_patient_record(1, 'Upsert Patient', 'diabetes', 30, {'Age': 30}, 0.0, 'Low Risk')
+    _save_patient_record(1, 'Upsert Patient', 'diabetes', 30, {'Age': 30}, 1.0, 'High Risk')
+
+    records, no_records = _get_patient_records(1, 'Upsert Patient', 'diabetes')
+    assert not no_records
+    assert len(records) == 1
+    assert records[0]['result'] == 1.0
+    assert records[0]['risk_label'] == 'High Risk'
+
+
+def test_save_patient_record_without_age():
+    """Test that a patient without an age (e.g. breast cancer) is updated, not duplicated."""
+    _save_patient_record(1, 'No Age Patient', 'breast-cancer', None, {'radius_mean': 1.0}, 0.0, 'Low Risk')
+    _save_patient_record(1, 'No Age Patient', 'breast-cancer', None, {'radius_mean': 2.0}, 1.0, 'High Risk')
+
+    records, no_records = _get_patient_records(1, 'No Age Patient', 'breast-cancer')
+    assert not no_records
+    assert len(records) == 1
+    assert records[0]['age'] is None
+    assert records[0]['features'] == {'radius_mean': 2.0}
+    assert records[0]['risk_label'] == 'High Risk'
+
+
+def test_migrate_pickled_features():
+    """Test that features pickled by the old PickleType column are rewritten as JSON."""
+    db.session.execute(
+        db.text(
+            "INSERT INTO patient_data (doctor_id, name, disease, age, features, result, risk_label) "
+            "VALUES (1, 'Pickled Patient', 'diabetes', 30, :features, 0.0, 'Low Risk')"
+        ),
+        {'features': pickle.dumps({'Age': np.int64(30), 'BMI': np.float64(20.5)})}
+    )
+    db.session.commit()
+
+    _migrate_pickled_features()
+
+    records, no_records = _get_patient_records(1, 'Pickled Patient', 'diabetes')
+    assert not no_records
+    assert records[0]['features'] == {'Age': 30, 'BMI': 20.5}
+
+
+def test_patient_record_writer():
+    """Test that queued records are committed by the background writer."""
+    writer = PatientRecordWriter()
+    futures = [
+        writer.submit(doctor_id=1, name='Queued Patient', disease='diabetes', age=age,
+                      features={'Age': age}, result=0.0, risk_label='Low Risk')
+        for age in (30, 40, 40)
+    ]
+    for future in futures:
+        future.result(timeout=10)
+
+    records, no_records = _get_patient_records(1, 'Queued Patient', 'diabetes')
+    assert not no_records
+    assert sorted(r['age'] for r in records) == [30, 40]
+
+
+@patch('google.generativeai.GenerativeModel')
+def test_gemini_recommendations(mock_model):
+    """Test Gemini recommendations generation (mocked)."""
+    # Setup mock response
+    mock_response = MagicMock()
+    mock_response.text = "1. Recommendation one\n2. Recommendation two"
+    mock_model.return_value.generate_content.return_value = mock_response
+
+    # Call the function
+    recommendations = get_gemini_recommendations('heart-attack', {'age': 50})
+
+    # Verify the response
+    assert len(recommendations) == 2
+    assert recommendations[0] == "Recommendation one"
+    assert recommendations[1] == "Recommendation two"
+
+
+def test_json_provider_numpy():
+    """Test that JSON responses serialize NumPy values."""
+    data = app.json.loads(app.json.dumps({'features': np.array([1.5, 2.0]), 'result': np.float64(1.0)}))
+    assert data == {'features': [1.5, 2.0], 'result': 1.0}
+
+
+@pytest.mark.parametrize('disease, feature', [
+    ('heart-attack', 'age'),
+    ('breast-cancer', 'radius_mean'),
+    ('diabetes', 'Glucose'),
+    ('lung-cancer', 'SMOKING'),
+])
+def test_feature_lists(disease, feature):
+    """Test that feature lists are properly defined."""
+    assert disease in FEATURE_LISTS
+
+    # Verify a key feature for the disease
+    assert feature in FEATURE_LISTS[disease]
+
+
+@pytest.mark.parametrize('disease, feature, label', [
+    ('heart-attack', 'sex', 'male'),
+    ('lung-cancer', 'GENDER', 'M'),
+])
+def test_label_to_numeric_mappings(disease, feature, label):
+    """Test that label to numeric mappings are properly defined."""
+    assert disease in LABEL_TO_NUMERIC
+
+    # Verify a key mapping
+    assert LABEL_TO_NUMERIC[disease][feature][label] == 1